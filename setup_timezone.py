@@ -6,14 +6,14 @@ Safely configures NTP-MCP with automatic detection and Claude integration
 
 import json
 import os
+import re
 import sys
 import subprocess
-import platform
 import shutil
 import time
+from functools import lru_cache
 from pathlib import Path
-from datetime import datetime
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, Tuple, Callable, List
 
 # ANSI color codes
 GREEN = '\033[0;32m'
@@ -22,24 +22,53 @@ RED = '\033[0;31m'
 BLUE = '\033[0;34m'
 NC = '\033[0m'  # No Color
 
-# Default NTP servers (approved list)
-APPROVED_SERVERS = [
+# Default NTP servers (approved list; ordered tuple for display, frozenset for lookups)
+APPROVED_SERVERS_DISPLAY = (
     "time.cloudflare.com",
     "time.google.com",
     "pool.ntp.org",
     "time.nist.gov",
     "time.windows.com",
     "time.apple.com",
-]
+)
+APPROVED_SERVERS = frozenset(APPROVED_SERVERS_DISPLAY)
 
 DEFAULT_NTP_SERVER = "time.cloudflare.com"
 
+# Timezone probe locations (built once, reused by every detection call)
+_ETC_TIMEZONE = "/etc/timezone"
+_ETC_LOCALTIME = "/etc/localtime"
+
+# Launch script default lines (compiled once, matched line-by-line)
+_TZ_RE = re.compile(r'^export TZ=.*$', re.M)
+_NTP_RE = re.compile(r'^export NTP_SERVER=.*$', re.M)
+
+# `claude mcp list` ntp entry; group 1 is the first status marker on the line ('' if none)
+_STATUS_RE = re.compile(r'^ntp:.*?(✓ Connected|✗ Failed|$)', re.M)
+
+# Upper bound for external commands; `claude mcp list` health-checks every
+# configured server, so the Claude CLI gets more headroom than timedatectl
+CLAUDE_CLI_TIMEOUT = 30  # seconds
+PROBE_TIMEOUT = 5  # seconds
+
+def _run(cmd: List[str], timeout: float = CLAUDE_CLI_TIMEOUT, check: bool = False) -> subprocess.CompletedProcess:
+    """Run an external command with captured output, no stdin and a bounded runtime"""
+    return subprocess.run(
+        cmd,
+        capture_output=True,
+        text=True,
+        stdin=subprocess.DEVNULL,
+        timeout=timeout,
+        check=check
+    )
+
 def print_color(message: str, color: str = NC):
     """Print colored message"""
     print(f"{color}{message}{NC}")
 
+@lru_cache(maxsize=None)
 def detect_system_timezone() -> str:
-    """Detect the system's timezone"""
+    """Detect the system's timezone (probed once per process, then cached)"""
     
     # Method 1: Try using tzlocal (most reliable)
     try:
@@ -50,58 +79,86 @@ def detect_system_timezone() -> str:
     except ImportError:
         pass
     
-    # Method 2: Check timedatectl on Linux
-    if platform.system() == "Linux":
+    # Method 2: Check TZ environment variable
+    if os.environ.get("TZ"):
+        return os.environ["TZ"]
+    
+    # Method 3: Check /etc/timezone
+    try:
+        with open(_ETC_TIMEZONE) as f:
+            tz = f.read().strip()
+        if tz:
+            return tz
+    except (OSError, UnicodeDecodeError):
+        pass
+    
+    # Method 4: Try to get from /etc/localtime symlink
+    try:
+        tz_path = os.readlink(_ETC_LOCALTIME)
+        # Extract timezone from path like /usr/share/zoneinfo/America/New_York
+        if "zoneinfo/" in tz_path:
+            return tz_path.split("zoneinfo/")[-1]
+    except OSError:
+        pass
+    
+    # Method 5: Check timedatectl on Linux (last resort - spawns a subprocess)
+    if sys.platform.startswith("linux"):
         try:
-            result = subprocess.run(
+            result = _run(
                 ["timedatectl", "show", "-p", "Timezone", "--value"],
-                capture_output=True,
-                text=True,
+                timeout=PROBE_TIMEOUT,
                 check=True
             )
             tz = result.stdout.strip()
             if tz:
                 return tz
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            pass
-    
-    # Method 3: Check /etc/timezone
-    if Path("/etc/timezone").exists():
-        try:
-            tz = Path("/etc/timezone").read_text().strip()
-            if tz:
-                return tz
-        except:
-            pass
-    
-    # Method 4: Check TZ environment variable
-    if os.environ.get("TZ"):
-        return os.environ["TZ"]
-    
-    # Method 5: Try to get from /etc/localtime symlink
-    if Path("/etc/localtime").is_symlink():
-        try:
-            tz_path = os.readlink("/etc/localtime")
-            # Extract timezone from path like /usr/share/zoneinfo/America/New_York
-            if "zoneinfo/" in tz_path:
-                return tz_path.split("zoneinfo/")[-1]
-        except:
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError):
             pass
     
     # Default to UTC
     print_color("⚠ Could not detect system timezone, defaulting to UTC", YELLOW)
     return "UTC"
 
+@lru_cache(maxsize=None)
 def check_claude_cli() -> bool:
-    """Check if Claude CLI is available"""
+    """Check if Claude CLI is available (in-process PATH lookup, cached)"""
+    return shutil.which("claude") is not None
+
+# Cached `claude mcp list` result, invalidated whenever an MCP is added or removed
+_mcp_list_cache: Optional[subprocess.CompletedProcess] = None
+
+def _mcp_list(force: bool = False, timeout: float = CLAUDE_CLI_TIMEOUT) -> subprocess.CompletedProcess:
+    """Run `claude mcp list` once and reuse the result until invalidated"""
+    global _mcp_list_cache
+    if force or _mcp_list_cache is None:
+        _mcp_list_cache = _run(["claude", "mcp", "list"], timeout=timeout)
+    return _mcp_list_cache
+
+def _wait_for_mcp_list(predicate: Callable[[str], bool], timeout: float, min_poll: float = 0.1) -> bool:
+    """Poll `claude mcp list` until predicate(stdout) holds or timeout expires
+    
+    Each listing is limited to the time left before the deadline (but at
+    least min_poll seconds), so a slow CLI cannot stretch the wait.
+    """
+    deadline = time.monotonic() + timeout
+    force = False
+    while True:
+        remaining = deadline - time.monotonic()
+        try:
+            if predicate(_mcp_list(force=force, timeout=max(remaining, min_poll)).stdout):
+                return True
+        except subprocess.TimeoutExpired:
+            pass  # Listing didn't finish in time - treat as "not yet"
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.05)
+        force = True
+
+def _wait_removed(timeout: float = 1.0) -> bool:
+    """Wait until the ntp entry is gone from `claude mcp list`"""
     try:
-        result = subprocess.run(
-            ["which", "claude"],
-            capture_output=True,
-            text=True
-        )
-        return result.returncode == 0
-    except:
+        return _wait_for_mcp_list(lambda out: _STATUS_RE.search(out) is None, timeout)
+    except Exception:
         return False
 
 def get_ntp_mcp_status() -> str:
@@ -110,49 +167,41 @@ def get_ntp_mcp_status() -> str:
         return "no_cli"
     
     try:
-        result = subprocess.run(
-            ["claude", "mcp", "list"],
-            capture_output=True,
-            text=True
-        )
+        result = _mcp_list()
         
         if result.returncode != 0:
             return "cli_error"
         
-        # Look for ntp in the output
-        for line in result.stdout.splitlines():
-            if line.startswith("ntp:"):
-                if "✓ Connected" in line:
-                    return "connected"
-                elif "✗ Failed" in line:
-                    return "failed"
-                else:
-                    return "unknown"
-        
-        return "not_installed"
+        # Look for ntp in the output (single scan over the whole listing)
+        match = _STATUS_RE.search(result.stdout)
+        if not match:
+            return "not_installed"
+        if match.group(1) == "✓ Connected":
+            return "connected"
+        if match.group(1) == "✗ Failed":
+            return "failed"
+        return "unknown"
     except Exception as e:
         print_color(f"Error checking MCP status: {e}", YELLOW)
         return "error"
 
 def remove_ntp_mcp() -> bool:
     """Remove existing NTP MCP installation"""
+    global _mcp_list_cache
+    _mcp_list_cache = None
     try:
-        subprocess.run(
-            ["claude", "mcp", "remove", "--scope", "user", "ntp"],
-            capture_output=True,
-            text=True
-        )
+        _run(["claude", "mcp", "remove", "--scope", "user", "ntp"])
         return True
     except:
         return False
 
 def add_ntp_mcp(launch_script: Path) -> bool:
     """Add NTP MCP to Claude"""
+    global _mcp_list_cache
+    _mcp_list_cache = None
     try:
-        result = subprocess.run(
-            ["claude", "mcp", "add", "--scope", "user", "ntp", "bash", str(launch_script)],
-            capture_output=True,
-            text=True
+        result = _run(
+            ["claude", "mcp", "add", "--scope", "user", "ntp", "bash", str(launch_script)]
         )
         return result.returncode == 0
     except Exception as e:
@@ -160,60 +209,56 @@ def add_ntp_mcp(launch_script: Path) -> bool:
         return False
 
 def verify_ntp_connection() -> bool:
-    """Verify NTP MCP is connected"""
-    time.sleep(2)  # Give it a moment to connect
+    """Verify NTP MCP is connected, giving it up to 2s to come up"""
+    def connected(out: str) -> bool:
+        match = _STATUS_RE.search(out)
+        return match is not None and match.group(1) == "✓ Connected"
     
     try:
-        result = subprocess.run(
-            ["claude", "mcp", "list"],
-            capture_output=True,
-            text=True
-        )
-        
-        return "ntp" in result.stdout and "✓ Connected" in result.stdout
+        # Let a slow CLI finish its health checks - a cut-off listing would
+        # report a working install as not connected
+        return _wait_for_mcp_list(connected, timeout=2.0, min_poll=CLAUDE_CLI_TIMEOUT)
     except:
         return False
 
-def fix_line_endings(file_path: Path):
-    """Fix Windows line endings in shell scripts"""
-    if not file_path.exists():
-        return
-    
-    try:
-        content = file_path.read_bytes()
-        # Replace CRLF with LF
-        content = content.replace(b'\r\n', b'\n')
-        file_path.write_bytes(content)
-    except Exception as e:
-        print_color(f"Warning: Could not fix line endings: {e}", YELLOW)
-
 def update_launch_script(launch_script: Path, timezone: str, ntp_server: str):
     """Update the launch script with new defaults"""
     if not launch_script.exists():
         return False
     
     try:
-        # Fix line endings first
-        fix_line_endings(launch_script)
-        
-        content = launch_script.read_text()
+        # Single read; fix Windows line endings in the same pass
+        original = launch_script.read_bytes()
+        content = original.replace(b'\r\n', b'\n').decode('utf-8')
         
         # Update TZ line
-        import re
-        content = re.sub(
-            r'export TZ=.*',
+        content = _TZ_RE.sub(
             f'export TZ="${{TZ:-{timezone}}}"',
             content
         )
         
         # Update NTP_SERVER line
-        content = re.sub(
-            r'export NTP_SERVER=.*',
+        content = _NTP_RE.sub(
             f'export NTP_SERVER="${{NTP_SERVER:-{ntp_server}}}"',
             content
         )
         
-        launch_script.write_text(content)
+        updated = content.encode('utf-8')
+        if updated == original:
+            # Re-run with the same settings - leave the file untouched
+            print_color("✓ Launch script defaults already up to date", GREEN)
+            return True
+        
+        # Write to a sibling temp file and swap it in atomically so an
+        # interrupted run never leaves a truncated launch script behind
+        tmp = launch_script.with_suffix(launch_script.suffix + ".tmp")
+        try:
+            tmp.write_bytes(updated)
+            shutil.copymode(launch_script, tmp)
+            os.replace(tmp, launch_script)
+        finally:
+            # Gone after a successful replace; removes the leftover on failure
+            tmp.unlink(missing_ok=True)
         print_color("✓ Updated launch script defaults", GREEN)
         return True
     except Exception as e:
@@ -266,7 +311,7 @@ def main():
     # Validate NTP server (optional warning)
     if ntp_server not in APPROVED_SERVERS:
         print_color(f"⚠ Note: '{ntp_server}' is not in the pre-approved list", YELLOW)
-        print("Pre-approved servers:", ", ".join(APPROVED_SERVERS))
+        print("Pre-approved servers:", ", ".join(APPROVED_SERVERS_DISPLAY))
         response = input("Continue? (Y/n): ")
         if response.lower() == 'n':
             print("Setup cancelled")
@@ -277,8 +322,8 @@ def main():
     
     # Update launch script with detected values
     print("Updating launch script defaults...")
-    if update_launch_script(launch_script, system_tz, ntp_server):
-        print_color("✓ Launch script updated", GREEN)
+    # update_launch_script reports its own outcome (updated / already up to date / failed)
+    update_launch_script(launch_script, system_tz, ntp_server)
     print()
     
     # Check Claude CLI availability
@@ -303,7 +348,7 @@ def main():
         if response.lower() == 'y':
             print("Updating NTP-MCP configuration...")
             remove_ntp_mcp()
-            time.sleep(1)
+            _wait_removed()
             if add_ntp_mcp(launch_script):
                 print_color("✓ NTP-MCP updated successfully!", GREEN)
             else:
@@ -316,7 +361,7 @@ def main():
         print_color("⚠ NTP-MCP is installed but failed to connect.", YELLOW)
         print("Reinstalling with corrected configuration...")
         remove_ntp_mcp()
-        time.sleep(1)
+        _wait_removed()
         if add_ntp_mcp(launch_script):
             print_color("✓ NTP-MCP reinstalled successfully!", GREEN)
         else:
@@ -342,7 +387,7 @@ def main():
         if not add_ntp_mcp(launch_script):
             print_color("Note: MCP might already be installed. Trying to update...", YELLOW)
             remove_ntp_mcp()
-            time.sleep(1)
+            _wait_removed()
             if add_ntp_mcp(launch_script):
                 print_color("✓ NTP-MCP configuration complete!", GREEN)
             else:
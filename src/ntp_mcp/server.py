@@ -2,17 +2,19 @@
 """NTP MCP Server - Secure time synchronization with enhanced security filtering"""
 
 import asyncio
-import ntplib
-from datetime import datetime, timezone
-import pytz
+from datetime import datetime, timezone, tzinfo
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import os
 import logging
 import re
+import sys
 import ipaddress
+import struct
 import time
+from functools import lru_cache, partial
 from typing import Optional, Tuple, List, Dict, Any
-from collections import deque, OrderedDict
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from collections import OrderedDict
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type, retry_if_not_exception_type
 
 from mcp.server.models import InitializationOptions
 import mcp.types as types
@@ -62,8 +64,18 @@ APPROVED_NTP_SERVERS = [
     "3.europe.pool.ntp.org",
 ]
 
-# Pre-compute lowercase set for performance
-APPROVED_SERVERS_LOWER = {s.lower() for s in APPROVED_NTP_SERVERS}
+# The approved list is static, so its tool reply is built once at import
+_APPROVED_LIST_RESPONSE = [
+    types.TextContent(
+        type="text",
+        text="Approved NTP Servers:\n"
+        + "\n".join(f"• {s}" for s in APPROVED_NTP_SERVERS)
+        + "\n\nNote: Untrusted domains and direct IP addresses are blocked for security."
+    )
+]
+
+# Pre-compute immutable lowercase set of interned names for performance
+APPROVED_SERVERS_LOWER = frozenset(sys.intern(s.lower()) for s in APPROVED_NTP_SERVERS)
 
 # Security: Combined regex pattern for efficiency (single pass instead of 10)
 # Blocks: Untrusted domains and security-risk patterns
@@ -74,9 +86,20 @@ BLOCKED_PATTERN = re.compile(
     r')',
     re.IGNORECASE
 )
+_blocked_search = BLOCKED_PATTERN.search
+
+# Security: Allowed characters for (punycode) server names; \Z rejects a trailing newline
+SERVER_NAME_RE = re.compile(r'^[a-zA-Z0-9._-]+\Z')
 
 # Constants
 DEFAULT_NTP_TIMEOUT = 5  # seconds - Standard timeout for NTP requests
+NTP_PORT = 123
+NTP_ENDPOINT_MAX_AGE = 300  # seconds - re-resolve pinned servers so DNS pools keep rotating
+NTP_EPOCH_OFFSET = 2208988800  # seconds from 1900-01-01 (NTP epoch) to 1970-01-01
+NTP_ERA_SECONDS = 2**32  # NTP seconds field wraps every 136 years (next in 2036)
+# Client request: LI=0, VN=3, Mode=3 (client); the transmit timestamp (last 8
+# bytes) is filled with random nonce bytes per request
+NTP_REQUEST_HEADER = b'\x1b' + bytes(39)
 MAX_REQUESTS_PER_MINUTE = 60  # Rate limit: 1 req/sec average (burst allowed)
 CACHE_TTL = 30  # seconds - Balance between performance and freshness
 # Cache size calculation:
@@ -85,42 +108,53 @@ CACHE_TTL = 30  # seconds - Balance between performance and freshness
 # - 100 entries * 200 bytes = 20KB (acceptable memory footprint)
 MAX_CACHE_SIZE = 100  # Optimized for memory vs hit rate balance
 
-# Rate limiting with deque for O(1) operations
-# Using deque without maxlen to manually control cleanup based on time window
-request_times: deque = deque()
+# Environment is fixed for the lifetime of an MCP stdio process - read it once
+_NTP_SERVER_ENV = os.getenv('NTP_SERVER', 'pool.ntp.org').strip()
+_TZ_ENV = os.getenv('TZ')
+
+# Rate limiting with a token bucket: two floats of state, O(1) per check
+# Bucket holds up to MAX_REQUESTS_PER_MINUTE tokens and refills at 1 token/sec
+_tb_tokens: float = float(MAX_REQUESTS_PER_MINUTE)
+_tb_last: float = time.monotonic()
 # Note: MCP servers handle one request at a time via stdio - no locks needed
 
 # Response cache using OrderedDict for O(1) LRU eviction
-response_cache: OrderedDict[str, Tuple[str, float]] = OrderedDict()
+# Timestamps are time.monotonic() values - immune to NTP-driven clock steps
+# Values hold the ready-to-return "(cached)" reply so hits allocate nothing
+response_cache: OrderedDict[str, Tuple[List[types.TextContent], float]] = OrderedDict()
 
 def is_rate_limited() -> bool:
-    """Check if rate limit has been exceeded using efficient deque.
+    """Check if rate limit has been exceeded using a token bucket.
     
     Note: No async/locking needed as MCP servers are single-threaded stdio.
     """
-    current_time = time.time()
+    global _tb_tokens, _tb_last
+    now = time.monotonic()
     
-    # Remove old requests (older than 60 seconds)
-    while request_times and current_time - request_times[0] >= 60:
-        request_times.popleft()
+    # Refill for the time elapsed since the last check, capped at the burst size
+    _tb_tokens = min(
+        MAX_REQUESTS_PER_MINUTE,
+        _tb_tokens + (now - _tb_last) * (MAX_REQUESTS_PER_MINUTE / 60.0)
+    )
+    _tb_last = now
     
-    if len(request_times) >= MAX_REQUESTS_PER_MINUTE:
+    if _tb_tokens < 1:
         return True
     
-    request_times.append(current_time)
+    _tb_tokens -= 1
     return False
 
-def get_cached_response(server: str) -> Optional[str]:
+def get_cached_response(cache_key: str) -> Optional[List[types.TextContent]]:
     """Get cached response if available and not expired.
     
-    Uses normalized server name as key to prevent cache poisoning.
+    Expects the normalized server name (see handle_call_tool) as key to
+    prevent cache poisoning.
     """
-    # Normalize server name to prevent cache poisoning
-    cache_key = server.lower().strip().rstrip('.')
-    
-    if cache_key in response_cache:
-        response, timestamp = response_cache[cache_key]
-        if time.time() - timestamp < CACHE_TTL:
+    # Single hash lookup instead of a membership test plus a subscript
+    entry = response_cache.get(cache_key)
+    if entry is not None:
+        response, timestamp = entry
+        if time.monotonic() - timestamp < CACHE_TTL:
             # Move to end to mark as recently used
             response_cache.move_to_end(cache_key)
             return response
@@ -128,24 +162,51 @@ def get_cached_response(server: str) -> Optional[str]:
             del response_cache[cache_key]
     return None
 
-def cache_response(server: str, response: str) -> None:
+def cache_response(cache_key: str, response: str) -> None:
     """Cache a response with O(1) LRU eviction.
     
     Uses OrderedDict for efficient oldest-entry removal.
-    Normalizes server names to prevent cache poisoning attacks.
+    Builds the "(cached)" TextContent reply once, at store time.
+    Expects the normalized server name as key to prevent cache poisoning.
     """
-    # Normalize server name to prevent cache poisoning
-    cache_key = server.lower().strip().rstrip('.')
-    
     # Implement O(1) cache size limit with OrderedDict
     if len(response_cache) >= MAX_CACHE_SIZE:
         # Remove oldest entry - O(1) operation with OrderedDict
         response_cache.popitem(last=False)
     
-    response_cache[cache_key] = (response, time.time())
+    cached_reply = [
+        types.TextContent(
+            type="text",
+            text=response + "\n(cached)"
+        )
+    ]
+    response_cache[cache_key] = (cached_reply, time.monotonic())
+
+@lru_cache(maxsize=32)
+def _resolve_tz(name: str) -> tzinfo:
+    """Resolve a TZ value once; TZ is effectively static for the process.
+    
+    Accepts bare zone names and the glibc ':'-prefixed forms, both
+    ":Area/City" and ":/path/to/tzfile" (e.g. ":/etc/localtime").
+    """
+    if name.startswith(':'):
+        name = name[1:]
+    if os.path.isabs(name):
+        # ZoneInfo keys can't be paths - load the TZif file directly, keyed by
+        # its zone name when it (or its symlink target) is under zoneinfo/
+        target = os.path.realpath(name)
+        key = target.split("zoneinfo/")[-1] if "zoneinfo/" in target else name
+        with open(name, 'rb') as f:
+            return ZoneInfo.from_file(f, key=key)
+    return ZoneInfo(name)
 
 def is_valid_ip(ip_str: str) -> Tuple[bool, str]:
     """Validate IP address (both IPv4 and IPv6)."""
+    # IPv4 literals start with a digit and IPv6 literals contain ':' - anything
+    # else cannot parse, so skip the exception-raising parser for hostnames
+    if not ip_str[:1].isdigit() and ':' not in ip_str:
+        return True, "Not an IP address"
+    
     try:
         # Try to parse as IP address
         ip = ipaddress.ip_address(ip_str)
@@ -156,32 +217,194 @@ def is_valid_ip(ip_str: str) -> Tuple[bool, str]:
         # Not an IP address
         return True, "Not an IP address"
 
+class NTPError(Exception):
+    """Invalid or unusable response from an NTP server."""
+
+class NTPKissOfDeath(NTPError):
+    """Server sent a Kiss-o'-Death (RATE, DENY, ...): stop querying, don't retry."""
+
+class _NTPClientProtocol(asyncio.DatagramProtocol):
+    """Long-lived SNTP client endpoint; replies are matched to requests by nonce."""
+    
+    def __init__(self) -> None:
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.pending: Dict[bytes, asyncio.Future] = {}
+    
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport
+    
+    def datagram_received(self, data: bytes, addr: Tuple[Any, ...]) -> None:
+        # Security: only accept a reply echoing one of our nonces (origin
+        # timestamp) so stray, late or spoofed datagrams cannot inject a time
+        response = self.pending.pop(data[24:32], None)
+        if response is not None and not response.done():
+            response.set_result(data)
+    
+    def error_received(self, exc: Exception) -> None:
+        # ICMP errors cannot be tied to one request - fail everything in flight
+        self._fail_pending(exc)
+    
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self._fail_pending(exc or NTPError("NTP endpoint closed"))
+    
+    def _fail_pending(self, exc: Exception) -> None:
+        for response in self.pending.values():
+            if not response.done():
+                response.set_exception(exc)
+        self.pending.clear()
+    
+    async def request(self, timeout: float) -> bytes:
+        """Send one client packet with a fresh nonce and await its reply."""
+        nonce = os.urandom(8)
+        response = asyncio.get_running_loop().create_future()
+        self.pending[nonce] = response
+        try:
+            self.transport.sendto(NTP_REQUEST_HEADER + nonce)
+            return await asyncio.wait_for(response, timeout=timeout)
+        finally:
+            self.pending.pop(nonce, None)
+
+# One connected UDP endpoint per approved server, reused across requests so
+# DNS resolution and socket setup happen at most once per NTP_ENDPOINT_MAX_AGE
+# (bounded by the approved list). Entries: (transport, protocol, created_at).
+_udp_endpoints: Dict[str, Tuple[asyncio.DatagramTransport, _NTPClientProtocol, float]] = {}
+
+def _endpoint_usable(entry: Optional[Tuple[asyncio.DatagramTransport, _NTPClientProtocol, float]]) -> bool:
+    """An endpoint is reused only while open and younger than the max age."""
+    return (
+        entry is not None
+        and not entry[0].is_closing()
+        and time.monotonic() - entry[2] < NTP_ENDPOINT_MAX_AGE
+    )
+
+async def _get_udp_endpoint(ntp_server: str) -> Tuple[asyncio.DatagramTransport, _NTPClientProtocol]:
+    """Return the pinned endpoint for a server, (re)creating it when missing or aged out.
+    
+    Periodic re-resolution keeps pool hostnames rotating across pool
+    members instead of pinning one address for the process lifetime.
+    """
+    entry = _udp_endpoints.get(ntp_server)
+    if _endpoint_usable(entry):
+        return entry[0], entry[1]
+    
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        _NTPClientProtocol,
+        remote_addr=(ntp_server, NTP_PORT)
+    )
+    # Another request may have created one while we were resolving
+    existing = _udp_endpoints.get(ntp_server)
+    if existing is not entry and _endpoint_usable(existing):
+        transport.close()
+        return existing[0], existing[1]
+    if entry is not None:
+        # Aged-out endpoint: let requests still in flight on it finish first
+        loop.call_later(DEFAULT_NTP_TIMEOUT, entry[0].close)
+    _udp_endpoints[ntp_server] = (transport, protocol, time.monotonic())
+    return transport, protocol
+
+def _drop_udp_endpoint(ntp_server: str, transport: asyncio.DatagramTransport) -> None:
+    """Close a failed endpoint so the next attempt re-resolves the host."""
+    entry = _udp_endpoints.get(ntp_server)
+    if entry is not None and entry[0] is transport:
+        del _udp_endpoints[ntp_server]
+    transport.close()
+
+def close_udp_endpoints() -> None:
+    """Close every pinned NTP endpoint (server shutdown)."""
+    for transport, _, _ in _udp_endpoints.values():
+        transport.close()
+    _udp_endpoints.clear()
+
+def parse_ntp_response(data: bytes) -> float:
+    """Extract the server transmit time (Unix seconds) from an NTP reply."""
+    if len(data) < 48:
+        raise NTPError(f"Invalid NTP packet: {len(data)} bytes")
+    
+    leap, mode, stratum = data[0] >> 6, data[0] & 0x7, data[1]
+    if mode != 4:
+        raise NTPError(f"Unexpected NTP mode {mode} (expected server reply)")
+    if stratum == 0:
+        raise NTPKissOfDeath(f"Kiss-o'-Death from server: {data[12:16].decode('ascii', 'replace')}")
+    if leap == 3 or stratum >= 16:
+        raise NTPError("Server clock is not synchronized")
+    
+    seconds, fraction = struct.unpack('!II', data[40:48])
+    # Timestamps below the Unix epoch belong to the next NTP era (post-2036)
+    if seconds < NTP_EPOCH_OFFSET:
+        seconds += NTP_ERA_SECONDS
+    return seconds - NTP_EPOCH_OFFSET + fraction / 2**32
+
+def format_local_time(local_dt: datetime) -> Tuple[str, str, str]:
+    """Split an aware datetime into (date, time, timezone) display strings."""
+    # One C-level isoformat call yields both date and HH:MM:SS
+    date_str, rest = local_dt.isoformat(timespec='seconds').split('T', 1)
+    # Zone abbreviation follows DST (EST/EDT), so it is formatted per call
+    timezone_str = local_dt.strftime("%Z") or str(local_dt.tzinfo)
+    return date_str, rest[:8], timezone_str
+
 def format_ntp_error(error_type: str, exc: Exception, logger) -> str:
     """Format NTP error messages consistently (DRY principle)."""
     msg = f"{error_type}: {exc}"
-    logger.warning(f"{msg}, falling back to local time")
+    logger.warning("%s, falling back to local time", msg)
     return msg
 
 def is_server_allowed(server_name: str) -> Tuple[bool, str]:
-    """Check if an NTP server is allowed based on security rules."""
-    server_lower = server_name.lower().strip()
+    """Check if an NTP server is allowed based on security rules.
     
-    # First check if it's an IP address
+    The whitelist is the only way to be allowed and contains no IPs or
+    blocked names, so an approved hit short-circuits the IP parse and the
+    blocked-pattern scan. Those only run on the deny path to pick the reason.
+    """
+    # Interned so approved hits compare by identity; the same few names recur
+    server_lower = sys.intern(server_name.lower().strip())
+    
+    # Fast path: approved list (using pre-computed set)
+    if server_lower in APPROVED_SERVERS_LOWER:
+        return True, f"Server '{server_name}' is in approved list"
+    
+    # Check if it's an IP address
     is_not_ip, ip_reason = is_valid_ip(server_lower)
     if not is_not_ip:
         return False, ip_reason
     
     # Check against combined blocked pattern (single regex pass)
-    if BLOCKED_PATTERN.search(server_lower):
+    if _blocked_search(server_lower):
         return False, f"Server '{server_name}' blocked: matches security pattern"
     
-    # Check if in approved list (using pre-computed set)
-    if server_lower in APPROVED_SERVERS_LOWER:
-        return True, f"Server '{server_name}' is in approved list"
-    
     # Default deny for unknown servers
     return False, f"Server '{server_name}' not in approved list (security policy: default deny)"
 
+@lru_cache(maxsize=64)
+def _validate_server(raw: str) -> Tuple[Optional[str], Optional[str]]:
+    """Validate a requested server name.
+    
+    Returns (ascii_name, None) when the server may be used, or
+    (None, error_text) with the user-facing error otherwise. The approved
+    list is static, so results are stable and safe to memoize; a blocked
+    name is therefore logged once per distinct value.
+    """
+    # Handle empty server name edge case
+    if not raw:
+        return None, "Error: Server name cannot be empty"
+    
+    # Validate server name with IDN support
+    try:
+        # Convert IDN to ASCII (punycode) for validation
+        ascii_server = raw.encode('idna').decode('ascii')
+    except (UnicodeError, UnicodeDecodeError):
+        return None, "Error: Invalid server name encoding (IDN conversion failed)"
+    if len(ascii_server) > 255 or not SERVER_NAME_RE.match(ascii_server):
+        return None, "Error: Invalid server name format"
+    
+    # Security check FIRST (before rate limiting to prevent bypass)
+    allowed, reason = is_server_allowed(ascii_server)
+    if not allowed:
+        logger.warning("Blocked NTP server request: %s", reason)
+        return None, f"Security Error: {reason}\n\nPlease use one of the approved servers. Use 'list_approved_servers' tool to see the list."
+    
+    return ascii_server, None
+
 @server.list_tools()
 async def handle_list_tools() -> List[types.Tool]:
     """List available tools."""
@@ -209,18 +432,46 @@ async def handle_list_tools() -> List[types.Tool]:
 @retry(
     stop=stop_after_attempt(3),
     wait=wait_exponential(multiplier=1, min=1, max=10),
-    retry=retry_if_exception_type((ntplib.NTPException, OSError, asyncio.TimeoutError)),
+    # RFC 5905: a Kiss-o'-Death means back off - never retry it
+    retry=(
+        retry_if_exception_type((NTPError, OSError, asyncio.TimeoutError))
+        & retry_if_not_exception_type(NTPKissOfDeath)
+    ),
     reraise=True
 )
 async def get_ntp_time_with_retry(ntp_server: str) -> float:
-    """Get NTP time with retry logic for specific exceptions."""
-    c = ntplib.NTPClient()
-    loop = asyncio.get_event_loop()
-    response = await loop.run_in_executor(
-        None, 
-        lambda: c.request(ntp_server, timeout=DEFAULT_NTP_TIMEOUT)
-    )
-    return response.tx_time
+    """Get NTP time with retry logic for specific exceptions.
+    
+    Native asyncio UDP over a reused per-server endpoint.
+    """
+    transport, protocol = await _get_udp_endpoint(ntp_server)
+    try:
+        data = await protocol.request(DEFAULT_NTP_TIMEOUT)
+    except (OSError, asyncio.TimeoutError, NTPError):
+        # Don't keep a dead address pinned - the retry resolves afresh
+        _drop_udp_endpoint(ntp_server, transport)
+        raise
+    return parse_ntp_response(data)
+
+# In-flight NTP lookups keyed by server: concurrent cache misses for the same
+# server share one round trip instead of each sending their own
+_inflight: Dict[str, asyncio.Task] = {}
+
+def _inflight_done(ntp_server: str, task: asyncio.Task) -> None:
+    _inflight.pop(ntp_server, None)
+    if not task.cancelled():
+        task.exception()  # Mark as retrieved; awaiting callers still get it
+
+async def get_ntp_time_coalesced(ntp_server: str) -> float:
+    """Get NTP time, joining an identical lookup that is already in flight."""
+    task = _inflight.get(ntp_server)
+    if task is None:
+        # No await between lookup and insert - safe on the single-threaded loop
+        task = asyncio.ensure_future(get_ntp_time_with_retry(ntp_server))
+        _inflight[ntp_server] = task
+        task.add_done_callback(partial(_inflight_done, ntp_server))
+    # Shield so one caller being cancelled doesn't cancel the shared lookup
+    return await asyncio.shield(task)
 
 @server.call_tool()
 async def handle_call_tool(
@@ -229,60 +480,29 @@ async def handle_call_tool(
     """Handle tool calls."""
     
     if name == "list_approved_servers":
-        servers_list = "\n".join(f"• {server}" for server in APPROVED_NTP_SERVERS)
-        return [
-            types.TextContent(
-                type="text",
-                text=f"Approved NTP Servers:\n{servers_list}\n\nNote: Untrusted domains and direct IP addresses are blocked for security."
-            )
-        ]
+        return _APPROVED_LIST_RESPONSE
     
     if name != "get_current_time":
         raise ValueError(f"Unknown tool: {name}")
     
     # Get NTP server from environment variable with validation
-    requested_server = os.getenv('NTP_SERVER', 'pool.ntp.org').strip()
+    requested_server = _NTP_SERVER_ENV
     
-    # Handle empty server name edge case
-    if not requested_server:
+    # Validate and security-check the name (memoized per distinct value)
+    ascii_server, error = _validate_server(requested_server)
+    if error:
         return [
             types.TextContent(
                 type="text",
-                text="Error: Server name cannot be empty"
-            )
-        ]
-    
-    # Validate server name with IDN support
-    try:
-        # Convert IDN to ASCII (punycode) for validation
-        ascii_server = requested_server.encode('idna').decode('ascii')
-        if len(ascii_server) > 255 or not re.match(r'^[a-zA-Z0-9._-]+$', ascii_server):
-            return [
-                types.TextContent(
-                    type="text",
-                    text="Error: Invalid server name format"
-                )
-            ]
-        # Use the ASCII version for all operations
-        requested_server = ascii_server
-    except (UnicodeError, UnicodeDecodeError):
-        return [
-            types.TextContent(
-                type="text",
-                text="Error: Invalid server name encoding (IDN conversion failed)"
-            )
-        ]
-    
-    # Security check FIRST (before rate limiting to prevent bypass)
-    allowed, reason = is_server_allowed(requested_server)
-    if not allowed:
-        logger.warning(f"Blocked NTP server request: {reason}")
-        return [
-            types.TextContent(
-                type="text",
-                text=f"Security Error: {reason}\n\nPlease use one of the approved servers. Use 'list_approved_servers' tool to see the list."
+                text=error
             )
         ]
+    # Use the ASCII version for all operations
+    requested_server = ascii_server
+    # Normalized cache key, computed once per request. Validation already
+    # rejects whitespace and only approved names (no trailing dot) get here,
+    # so lowercasing is the only normalization left to do.
+    cache_key = requested_server.lower()
     
     # Check rate limiting AFTER security validation
     if is_rate_limited():
@@ -294,24 +514,19 @@ async def handle_call_tool(
         ]
     
     # Check cache first (no async needed)
-    cached_response = get_cached_response(requested_server)
+    cached_response = get_cached_response(cache_key)
     if cached_response:
-        logger.info(f"Returning cached response for {requested_server}")
-        return [
-            types.TextContent(
-                type="text",
-                text=cached_response + "\n(cached)"
-            )
-        ]
+        logger.info("Returning cached response for %s", requested_server)
+        return cached_response
     
-    logger.info(f"Using approved NTP server: {requested_server}")
+    logger.info("Using approved NTP server: %s", requested_server)
     
     # Get time zone from environment variable
-    tz_name = os.getenv('TZ')
+    tz_name = _TZ_ENV
     if tz_name:
         try:
-            tz = pytz.timezone(tz_name)
-        except pytz.UnknownTimeZoneError:
+            tz = _resolve_tz(tz_name)
+        except (ZoneInfoNotFoundError, ValueError, OSError):
             return [
                 types.TextContent(
                     type="text",
@@ -326,41 +541,38 @@ async def handle_call_tool(
     
     try:
         # Attempt to get time from NTP server with retry
-        tx_time = await get_ntp_time_with_retry(requested_server)
-        utc_dt = datetime.fromtimestamp(tx_time, timezone.utc)
+        tx_time = await get_ntp_time_coalesced(requested_server)
         
         # Convert to desired time zone or system's local time zone
         if tz:
-            local_dt = utc_dt.astimezone(tz)
+            # Build the zone-aware datetime directly (no UTC intermediate)
+            local_dt = datetime.fromtimestamp(tx_time, tz)
         else:
-            local_dt = utc_dt.astimezone()  # System's local time zone
+            local_dt = datetime.fromtimestamp(tx_time, timezone.utc).astimezone()  # System's local time zone
         
         # Format the time according to the requested format
-        date_str = local_dt.strftime("%Y-%m-%d")
-        time_str = local_dt.strftime("%H:%M:%S")
-        # Optimize timezone string formatting
-        timezone_str = local_dt.strftime("%Z") or str(local_dt.tzinfo)
+        date_str, time_str, timezone_str = format_local_time(local_dt)
         
         result = f"Date:{date_str}\nTime:{time_str}\nTimezone:{timezone_str}\nNTP Server:{requested_server}\nSource:NTP"
-        logger.info(f"NTP time retrieved: {result}")
+        logger.info("NTP time retrieved: %s", result)
         
         # Cache the response
-        cache_response(requested_server, result)
+        cache_response(cache_key, result)
         
-    except ntplib.NTPException as e:
+    except NTPError as e:
         # Specific NTP error handling
         error_msg = format_ntp_error("NTP protocol error", e, logger)
+    except asyncio.TimeoutError:
+        # Timeout handling (before OSError: TimeoutError subclasses it)
+        error_msg = f"NTP timeout after {DEFAULT_NTP_TIMEOUT}s"
+        logger.warning("%s, falling back to local time", error_msg)
     except OSError as e:
         # Network/OS error handling
         error_msg = format_ntp_error("Network error", e, logger)
-    except asyncio.TimeoutError:
-        # Timeout handling
-        error_msg = f"NTP timeout after {DEFAULT_NTP_TIMEOUT}s"
-        logger.warning(f"{error_msg}, falling back to local time")
     except Exception as e:
         # Unexpected errors (should be rare now)
         error_msg = f"Unexpected error: {e}"
-        logger.error(f"{error_msg}, falling back to local time")
+        logger.error("%s, falling back to local time", error_msg)
     else:
         # Success - return the result
         return [
@@ -381,10 +593,7 @@ async def handle_call_tool(
             local_dt = utc_now.astimezone()
         
         # Format the time according to the requested format
-        date_str = local_dt.strftime("%Y-%m-%d")
-        time_str = local_dt.strftime("%H:%M:%S")
-        # Optimize timezone string formatting
-        timezone_str = local_dt.strftime("%Z") or str(local_dt.tzinfo)
+        date_str, time_str, timezone_str = format_local_time(local_dt)
         
         # IMPORTANT: Notify user this is a fallback
         result = f"Date:{date_str}\nTime:{time_str}\nTimezone:{timezone_str}\nSource:LOCAL SYSTEM (NTP unavailable: {error_msg})"
@@ -392,7 +601,7 @@ async def handle_call_tool(
     except Exception as e2:
         # If all else fails, return an error
         result = f"Error: Failed to get time - {str(e2)}"
-        logger.error(f"Failed to get time: {str(e2)}")
+        logger.error("Failed to get time: %s", e2)
     
     return [
         types.TextContent(
@@ -404,18 +613,21 @@ async def handle_call_tool(
 async def main():
     """Run the server using stdio."""
     async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
-        await server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="ntp-server",
-                server_version="1.0.0",
-                capabilities=server.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={},
+        try:
+            await server.run(
+                read_stream,
+                write_stream,
+                InitializationOptions(
+                    server_name="ntp-server",
+                    server_version="1.0.0",
+                    capabilities=server.get_capabilities(
+                        notification_options=NotificationOptions(),
+                        experimental_capabilities={},
+                    ),
                 ),
-            ),
-        )
+            )
+        finally:
+            close_udp_endpoints()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file